@@ -42,11 +42,19 @@ __all__ = [
 import abc
 import logging
 import re
-from collections.abc import Sequence
+from collections.abc import Iterator, Sequence
 from typing import Any
 
 _LOG = logging.getLogger(__name__)
 
+_SIGNAL_RE = re.compile(r"signal (\d+)", re.ASCII)
+"""Pattern for extracting the signal number from the job's hold reason.
+"""
+
+_SPECIAL_HOLD_REASON_CODES = frozenset({1, 3})
+"""Hold reason codes (by the user, by a signal) having dedicated handlers.
+"""
+
 
 class Handler(abc.ABC):
     """Abstract base class defining Handler interface."""
@@ -93,6 +101,9 @@ class Chain(Sequence):
     def __getitem__(self, index: int) -> Handler:
         return self._handlers[index]
 
+    def __iter__(self) -> Iterator[Handler]:
+        return iter(self._handlers)
+
     def __len__(self) -> int:
         return len(self._handlers)
 
@@ -155,12 +166,13 @@ class JobCompletedWithExecTicketHandler(Handler):
 
     def handle(self, ad: dict[str, Any]) -> dict[str, Any] | None:
         if not ad["MyType"].endswith("TerminatedEvent"):
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': job not completed",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': job not completed",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         if "ToE" in ad:
             toe = ad["ToE"]
@@ -170,12 +182,13 @@ class JobCompletedWithExecTicketHandler(Handler):
             else:
                 ad["ExitCode"] = toe["ExitCode"]
         else:
-            _LOG.debug(
-                "%s: refusing to process the ad for the job '%s.%s': ticket of execution missing",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "%s: refusing to process the ad for the job '%s.%s': ticket of execution missing",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         return ad
 
@@ -192,12 +205,13 @@ class JobCompletedWithoutExecTicketHandler(Handler):
 
     def handle(self, ad: dict[str, Any]) -> dict[str, Any] | None:
         if not ad["MyType"].endswith("TerminatedEvent"):
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': job not completed",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': job not completed",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         if "ToE" not in ad:
             ad["ExitBySignal"] = not ad["TerminatedNormally"]
@@ -206,12 +220,13 @@ class JobCompletedWithoutExecTicketHandler(Handler):
             else:
                 ad["ExitCode"] = ad["ReturnValue"]
         else:
-            _LOG.debug(
-                "%s: refusing to process the ad for the job '%s.%s': ticket of execution found",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "%s: refusing to process the ad for the job '%s.%s': ticket of execution found",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         return ad
 
@@ -221,25 +236,27 @@ class JobHeldByOtherHandler(Handler):
 
     def handle(self, ad: dict[str, Any]) -> dict[str, Any] | None:
         if not ad["MyType"].endswith("HeldEvent"):
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
-        if ad["HoldReasonCode"] not in {1, 3}:
+        if ad["HoldReasonCode"] not in _SPECIAL_HOLD_REASON_CODES:
             ad["ExitBySignal"] = False
             ad["ExitCode"] = ad["HoldReasonCode"]
         else:
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': "
-                "invalid hold reason code: HoldReasonCode = %s",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-                ad["HoldReasonCode"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': "
+                    "invalid hold reason code: HoldReasonCode = %s",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                    ad["HoldReasonCode"],
+                )
             return None
         return ad
 
@@ -249,38 +266,41 @@ class JobHeldBySignalHandler(Handler):
 
     def handle(self, ad: dict[str, Any]) -> dict[str, Any] | None:
         if not ad["MyType"].endswith("HeldEvent"):
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         if ad["HoldReasonCode"] == 3:
-            match = re.search(r"signal (\d+)", ad["HoldReason"])
+            match = _SIGNAL_RE.search(ad["HoldReason"])
             if match is not None:
                 ad["ExitBySignal"] = True
                 ad["ExitSignal"] = match.group(1)
             else:
+                if _LOG.isEnabledFor(logging.DEBUG):
+                    _LOG.debug(
+                        "Handler '%s': refusing to process the ad for the job '%s.%s': "
+                        "signal not found: HoldReason = %s",
+                        self.__class__.__name__,
+                        ad["ClusterId"],
+                        ad["ProcId"],
+                        ad["HoldReason"],
+                    )
+                return None
+        else:
+            if _LOG.isEnabledFor(logging.DEBUG):
                 _LOG.debug(
                     "Handler '%s': refusing to process the ad for the job '%s.%s': "
-                    "signal not found: HoldReason = %s",
+                    "job not held by a signal: HoldReasonCode = %s, HoldReason = %s",
                     self.__class__.__name__,
                     ad["ClusterId"],
                     ad["ProcId"],
+                    ad["HoldReasonCode"],
                     ad["HoldReason"],
                 )
-                return None
-        else:
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': "
-                "job not held by a signal: HoldReasonCode = %s, HoldReason = %s",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-                ad["HoldReasonCode"],
-                ad["HoldReason"],
-            )
             return None
         return ad
 
@@ -290,26 +310,28 @@ class JobHeldByUserHandler(Handler):
 
     def handle(self, ad: dict[str, Any]) -> dict[str, Any] | None:
         if not ad["MyType"].endswith("HeldEvent"):
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': job not held",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                )
             return None
         if ad["HoldReasonCode"] == 1:
             ad["ExitBySignal"] = False
             ad["ExitCode"] = 0
         else:
-            _LOG.debug(
-                "Handler '%s': refusing to process the ad for the job '%s.%s': "
-                "job not held by the user: HoldReasonCode = %s, HoldReason = %s",
-                self.__class__.__name__,
-                ad["ClusterId"],
-                ad["ProcId"],
-                ad["HoldReasonCode"],
-                ad["HoldReason"],
-            )
+            if _LOG.isEnabledFor(logging.DEBUG):
+                _LOG.debug(
+                    "Handler '%s': refusing to process the ad for the job '%s.%s': "
+                    "job not held by the user: HoldReasonCode = %s, HoldReason = %s",
+                    self.__class__.__name__,
+                    ad["ClusterId"],
+                    ad["ProcId"],
+                    ad["HoldReasonCode"],
+                    ad["HoldReason"],
+                )
             return None
         return ad
 
@@ -31,9 +31,11 @@
 __all__ = ["HTCondorService", "HTCondorWorkflow"]
 
 
+import functools
 import logging
 import os
 import re
+import types
 from collections import defaultdict
 from enum import IntEnum, auto
 from pathlib import Path
@@ -111,6 +113,112 @@ DEFAULT_HTC_EXEC_PATT = ".*worker.*"
 
 _LOG = logging.getLogger(__name__)
 
+_ENV_VAR_RE = re.compile(r"<ENV:([^>]+)>")
+"""Pattern matching BPS environment variable placeholders.
+"""
+
+_FILE_VAR_RE = re.compile(r"<FILE:([^>]+)>")
+"""Pattern matching BPS file placeholders.
+"""
+
+_BPS_ATTR_RE = re.compile(r"\+(bps_[^\s]+)\s*=\s*(.+)$")
+"""Pattern matching BPS attribute lines in HTCondor submit files.
+"""
+
+_DAG_STATE_COUNT_KEYS = (
+    (WmsStates.UNREADY, ("DAG_NodesUnready",)),
+    (WmsStates.READY, ("DAG_NodesReady",)),
+    (WmsStates.HELD, ("DAG_JobsHeld",)),
+    (WmsStates.SUCCEEDED, ("DAG_NodesDone",)),
+    (WmsStates.FAILED, ("DAG_NodesFailed",)),
+    (WmsStates.PRUNED, ("DAG_NodesFutile",)),
+    (WmsStates.MISFIT, ("DAG_NodesPre", "DAG_NodesPost")),
+)
+"""DAGMan job classad attributes (set in the queue) whose values are summed
+to count the DAG nodes in each WMS state.
+"""
+
+_NODE_STATE_COUNT_KEYS = (
+    (WmsStates.UNREADY, ("NodesUnready",)),
+    (WmsStates.READY, ("NodesReady",)),
+    (WmsStates.HELD, ("JobProcsHeld",)),
+    (WmsStates.SUCCEEDED, ("NodesDone",)),
+    (WmsStates.FAILED, ("NodesFailed",)),
+    (WmsStates.PRUNED, ("NodesFutile",)),
+    (WmsStates.MISFIT, ("NodesPre", "NodesPost")),
+)
+"""DAGMan node status file attributes whose values are summed to count
+the DAG nodes in each WMS state.
+"""
+
+_JOB_STATUS_TO_WMS_STATE = {
+    JobStatus.IDLE: WmsStates.PENDING,
+    JobStatus.RUNNING: WmsStates.RUNNING,
+    JobStatus.REMOVED: WmsStates.DELETED,
+    JobStatus.HELD: WmsStates.HELD,
+}
+"""WMS states of jobs whose state depends only on their HTCondor job status
+(completed jobs need their exit status checked too).
+"""
+
+_FINAL_POST_SCRIPT = os.path.join(os.path.dirname(__file__), "final_post.sh")
+"""Default DAGMan post script for the workflow's final job.
+"""
+
+_DEFAULT_JOB_CMDS = {
+    "universe": "vanilla",
+    "should_transfer_files": "YES",
+    "when_to_transfer_output": "ON_EXIT_OR_EVICT",
+    "transfer_output_files": '""',  # Set to empty string to disable
+    "transfer_executable": "False",
+    "getenv": "True",
+    # Exceeding memory sometimes triggering SIGBUS or SIGSEGV error. Tell
+    # htcondor to put on hold any jobs which exited by a signal.
+    "on_exit_hold": "ExitBySignal == true",
+    "on_exit_hold_reason": 'strcat("Job raised a signal ", string(ExitSignal), ". ", '
+    '"Handling signal as if job has gone over memory limit.")',
+    "on_exit_hold_subcode": "34",
+}
+"""Submit commands common to all HTCondor jobs (may be overridden by
+job-specific values).
+"""
+
+# Job ClassAds attributes 'HoldReasonCode' and 'HoldReasonSubCode' are
+# UNDEFINED if job is not HELD (i.e. when 'JobStatus' is not 5).
+# The special comparison operators ensure that all comparisons below will
+# evaluate to FALSE in this case.
+#
+# Note:
+# May not be strictly necessary. Operators '&&' and '||' are not strict so
+# the entire expression should evaluate to FALSE when the job is not HELD.
+# According to ClassAd evaluation semantics FALSE && UNDEFINED is FALSE,
+# but better safe than sorry.
+_WAS_MEM_EXCEEDED_EXPR = (
+    "JobStatus == 5 "
+    "&& (HoldReasonCode =?= 34 && HoldReasonSubCode =?= 0 "
+    "|| HoldReasonCode =?= 3 && HoldReasonSubCode =?= 34)"
+)
+"""HTCondor ClassAd expression checking if a job is held because it exceeded
+its memory requirements.
+"""
+
+# The check if the job was held due to exceeding memory requirements
+# will be made *after* job was released back to the job queue (is in
+# the IDLE state), hence the need to use `Last*` job ClassAds instead of
+# the ones describing job's current state.
+#
+# Also, 'Last*' job ClassAds attributes are UNDEFINED when a job is
+# initially put in the job queue. The special comparison operators ensure
+# that all comparisons below will evaluate to FALSE in this case.
+_LAST_WAS_MEM_EXCEEDED_EXPR = (
+    "LastJobStatus =?= 5 "
+    "&& (LastHoldReasonCode =?= 34 && LastHoldReasonSubCode =?= 0 "
+    "|| LastHoldReasonCode =?= 3 && LastHoldReasonSubCode =?= 34)"
+)
+"""HTCondor ClassAd expression checking if a job was held, before its last
+release, because it exceeded its memory requirements.
+"""
+
 
 class HTCondorService(BaseWmsService):
     """HTCondor version of WMS service."""
@@ -235,15 +343,20 @@ class HTCondorService(BaseWmsService):
                 return None, None, f"submit directory '{wms_path}' for run id '{wms_workflow_id}' not found."
 
         _LOG.info("Restarting workflow from directory '%s'", wms_path)
-        rescue_dags = list(wms_path.glob("*.dag.rescue*"))
-        if not rescue_dags:
+        # Only need to know whether there is any rescue DAG, stop at the first.
+        rescue_dag = next(wms_path.glob("*.dag.rescue*"), None)
+        if rescue_dag is None:
             return None, None, f"HTCondor rescue DAG(s) not found in '{wms_path}'"
 
         _LOG.info("Verifying that the workflow is not already in the job queue")
-        schedd_dag_info = condor_q(constraint=f'regexp("dagman$", Cmd) && Iwd == "{wms_path}"')
+        # Compare the submit directory first so the regular expression is
+        # evaluated only for the jobs from that directory.
+        schedd_dag_info = condor_q(
+            constraint=f'Iwd == "{wms_path}" && regexp("dagman$", Cmd)', projection=["GlobalJobId"]
+        )
         if schedd_dag_info:
-            _, dag_info = schedd_dag_info.popitem()
-            _, dag_ad = dag_info.popitem()
+            dag_info = next(iter(schedd_dag_info.values()))
+            dag_ad = next(iter(dag_info.values()))
             id_ = dag_ad["GlobalJobId"]
             return None, None, f"Workflow already in the job queue (global job id: '{id_}')"
 
@@ -584,10 +697,13 @@ class HTCondorWorkflow(BaseWmsWorkflow):
 
         # Create all DAG jobs
         site_values = {}  # cache compute site specific values to reduce config lookups
+        pool_memory_limits = {}  # cache memory limits to query the pool once per pattern
         for job_name in generic_workflow:
             gwjob = generic_workflow.get_job(job_name)
             if gwjob.compute_site not in site_values:
-                site_values[gwjob.compute_site] = _gather_site_values(config, gwjob.compute_site)
+                site_values[gwjob.compute_site] = _gather_site_values(
+                    config, gwjob.compute_site, pool_memory_limits
+                )
             htc_job = _create_job(
                 subdir_template[gwjob.label],
                 site_values[gwjob.compute_site],
@@ -605,7 +721,9 @@ class HTCondorWorkflow(BaseWmsWorkflow):
         final = generic_workflow.get_final()
         if final and isinstance(final, GenericWorkflowJob):
             if final.compute_site and final.compute_site not in site_values:
-                site_values[final.compute_site] = _gather_site_values(config, final.compute_site)
+                site_values[final.compute_site] = _gather_site_values(
+                    config, final.compute_site, pool_memory_limits
+                )
             final_htjob = _create_job(
                 subdir_template[final.label],
                 site_values[final.compute_site],
@@ -614,9 +732,7 @@ class HTCondorWorkflow(BaseWmsWorkflow):
                 out_prefix,
             )
             if "post" not in final_htjob.dagcmds:
-                final_htjob.dagcmds["post"] = (
-                    f"{os.path.dirname(__file__)}/final_post.sh {final.name} $DAG_STATUS $RETURN"
-                )
+                final_htjob.dagcmds["post"] = f"{_FINAL_POST_SCRIPT} {final.name} $DAG_STATUS $RETURN"
             htc_workflow.dag.add_final_job(final_htjob)
         elif final and isinstance(final, GenericWorkflow):
             raise NotImplementedError("HTCondor plugin does not support a workflow as the final job")
@@ -634,10 +750,15 @@ class HTCondorWorkflow(BaseWmsWorkflow):
             Directory prefix for HTCondor files.
         """
         self.submit_path = out_prefix
-        os.makedirs(out_prefix, exist_ok=True)
 
-        # Write down the workflow in HTCondor format.
-        self.dag.write(out_prefix, "jobs/{self.label}")
+        # Write down the workflow in HTCondor format. HTCDag.write() creates
+        # the submit directory if it does not exist yet.
+        #
+        # Note: 'job_subdir' is intentionally *not* an f-string. It is
+        # a template expanded by HTCJob.write_submit_file() for each job
+        # (with 'self' being the job, not the workflow) and only used for
+        # jobs without an explicitly set submit file.
+        self.dag.write(out_prefix, job_subdir="jobs/{self.label}")
 
 
 def _create_job(subdir_template, site_values, generic_workflow, gwjob, out_prefix):
@@ -671,27 +792,13 @@ def _create_job(subdir_template, site_values, generic_workflow, gwjob, out_prefi
     subdir = subdir_template.format_map(curvals)
     htc_job.subfile = Path("jobs") / subdir / f"{gwjob.name}.sub"
 
-    htc_job_cmds = {
-        "universe": "vanilla",
-        "should_transfer_files": "YES",
-        "when_to_transfer_output": "ON_EXIT_OR_EVICT",
-        "transfer_output_files": '""',  # Set to empty string to disable
-        "transfer_executable": "False",
-        "getenv": "True",
-        # Exceeding memory sometimes triggering SIGBUS or SIGSEGV error. Tell
-        # htcondor to put on hold any jobs which exited by a signal.
-        "on_exit_hold": "ExitBySignal == true",
-        "on_exit_hold_reason": 'strcat("Job raised a signal ", string(ExitSignal), ". ", '
-        '"Handling signal as if job has gone over memory limit.")',
-        "on_exit_hold_subcode": "34",
-    }
-
-    htc_job_cmds.update(_translate_job_cmds(site_values, generic_workflow, gwjob))
+    htc_job_cmds = {**_DEFAULT_JOB_CMDS, **_translate_job_cmds(site_values, generic_workflow, gwjob)}
 
     # job stdout, stderr, htcondor user log.
     for key in ("output", "error", "log"):
         htc_job_cmds[key] = htc_job.subfile.with_suffix(f".$(Cluster).{key[:3]}")
-        _LOG.debug("HTCondor %s = %s", key, htc_job_cmds[key])
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug("HTCondor %s = %s", key, htc_job_cmds[key])
 
     htc_job_cmds.update(
         _handle_job_inputs(generic_workflow, gwjob.name, site_values["bpsUseShared"], out_prefix)
@@ -703,7 +810,8 @@ def _create_job(subdir_template, site_values, generic_workflow, gwjob, out_prefi
     htc_job.add_dag_cmds(_translate_dag_cmds(gwjob))
 
     # Add job attributes to job.
-    _LOG.debug("gwjob.attrs = %s", gwjob.attrs)
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug("gwjob.attrs = %s", gwjob.attrs)
     htc_job.add_job_attrs(gwjob.attrs)
     htc_job.add_job_attrs(site_values["attrs"])
     htc_job.add_job_attrs({"bps_job_quanta": create_count_summary(gwjob.quanta_counts)})
@@ -759,9 +867,7 @@ def _translate_job_cmds(cached_vals, generic_workflow, gwjob):
         if isinstance(gwjob.retry_unless_exit, int):
             jobcmds["retry_until"] = f"{gwjob.retry_unless_exit}"
         elif isinstance(gwjob.retry_unless_exit, list):
-            jobcmds["retry_until"] = (
-                f'member(ExitCode, {{{",".join([str(x) for x in gwjob.retry_unless_exit])}}})'
-            )
+            jobcmds["retry_until"] = f'member(ExitCode, {{{",".join(map(str, gwjob.retry_unless_exit))}}})'
         else:
             raise ValueError("retryUnlessExit must be an integer or a list of integers.")
 
@@ -791,22 +897,7 @@ def _translate_job_cmds(cached_vals, generic_workflow, gwjob):
         if gwjob.request_memory_max and gwjob.request_memory_max < memory_limit:
             memory_max = gwjob.request_memory_max
 
-        # Make job ask for more memory each time it failed due to insufficient
-        # memory requirements.
-        jobcmds["request_memory"] = _create_request_memory_expr(
-            gwjob.request_memory, gwjob.memory_multiplier, memory_max
-        )
-
-        # Periodically release jobs which are being held due to exceeding
-        # memory. Stop doing that (by removing the job from the HTCondor queue)
-        # after the maximal number of retries has been reached or the job was
-        # already run at maximal allowed memory.
-        jobcmds["periodic_release"] = _create_periodic_release_expr(
-            gwjob.request_memory, gwjob.memory_multiplier, memory_max
-        )
-        jobcmds["periodic_remove"] = _create_periodic_remove_expr(
-            gwjob.request_memory, gwjob.memory_multiplier, memory_max
-        )
+        jobcmds.update(_create_memory_scaling_cmds(gwjob.request_memory, gwjob.memory_multiplier, memory_max))
 
     # Assume concurrency_limit implemented using HTCondor concurrency limits.
     # May need to move to special site-specific implementation if sites use
@@ -875,10 +966,41 @@ def _fix_env_var_syntax(oldstr):
     newstr : `str`
         Given string with environment variable syntax fixed.
     """
-    newstr = oldstr
-    for key in re.findall(r"<ENV:([^>]+)>", oldstr):
-        newstr = newstr.replace(rf"<ENV:{key}>", f"$ENV({key})")
-    return newstr
+    return _ENV_VAR_RE.sub(r"$ENV(\1)", oldstr)
+
+
+def _resolve_uri(gwfile, use_shared, is_input):
+    """Get the path to use in a job's command line for a given file.
+
+    Parameters
+    ----------
+    gwfile : `lsst.ctrl.bps.GenericWorkflowFile`
+        The file to get the path for.
+    use_shared : `bool`
+        Whether HTCondor can assume shared filesystem.
+    is_input : `bool`
+        Whether the file is an input of the job.
+
+    Returns
+    -------
+    uri : `str`
+        The path to the file as seen by the job.
+    """
+    if not gwfile.wms_transfer:
+        # Must assume full URI if in command line and told WMS is not
+        # responsible for transferring file.
+        uri = gwfile.src_uri
+    elif use_shared and gwfile.job_shared:
+        # Have shared filesystems and jobs can share file.
+        uri = gwfile.src_uri
+    elif is_input and use_shared and gwfile.name == "butlerConfig" and Path(gwfile.src_uri).suffix != ".yaml":
+        # Taking advantage of inside knowledge.  Not future-proof.
+        # Temporary fix until have job wrapper that pulls files
+        # within job.
+        uri = "butler.yaml"
+    else:  # Using push transfer or the file is not shared between jobs.
+        uri = os.path.basename(gwfile.src_uri)
+    return uri
 
 
 def _replace_file_vars(use_shared, arguments, workflow, gwjob):
@@ -901,43 +1023,20 @@ def _replace_file_vars(use_shared, arguments, workflow, gwjob):
     arguments : `str`
         Given arguments string with file placeholders replaced.
     """
-    # Replace input file placeholders with paths.
+    # Map file placeholders to paths. If a file is both a job's input and
+    # its output, the path for the input takes precedence.
+    uris = {}
     for gwfile in workflow.get_job_inputs(gwjob.name, data=True, transfer_only=False):
-        if not gwfile.wms_transfer:
-            # Must assume full URI if in command line and told WMS is not
-            # responsible for transferring file.
-            uri = gwfile.src_uri
-        elif use_shared:
-            if gwfile.job_shared:
-                # Have shared filesystems and jobs can share file.
-                uri = gwfile.src_uri
-            else:
-                # Taking advantage of inside knowledge.  Not future-proof.
-                # Temporary fix until have job wrapper that pulls files
-                # within job.
-                if gwfile.name == "butlerConfig" and Path(gwfile.src_uri).suffix != ".yaml":
-                    uri = "butler.yaml"
-                else:
-                    uri = os.path.basename(gwfile.src_uri)
-        else:  # Using push transfer
-            uri = os.path.basename(gwfile.src_uri)
-        arguments = arguments.replace(f"<FILE:{gwfile.name}>", uri)
-
-    # Replace output file placeholders with paths.
+        if gwfile.name not in uris:
+            uris[gwfile.name] = _resolve_uri(gwfile, use_shared, is_input=True)
     for gwfile in workflow.get_job_outputs(gwjob.name, data=True, transfer_only=False):
-        if not gwfile.wms_transfer:
-            # Must assume full URI if in command line and told WMS is not
-            # responsible for transferring file.
-            uri = gwfile.src_uri
-        elif use_shared:
-            if gwfile.job_shared:
-                # Have shared filesystems and jobs can share file.
-                uri = gwfile.src_uri
-            else:
-                uri = os.path.basename(gwfile.src_uri)
-        else:  # Using push transfer
-            uri = os.path.basename(gwfile.src_uri)
-        arguments = arguments.replace(f"<FILE:{gwfile.name}>", uri)
+        if gwfile.name not in uris:
+            uris[gwfile.name] = _resolve_uri(gwfile, use_shared, is_input=False)
+
+    # Replace all file placeholders in a single pass leaving the ones without
+    # a matching file intact.
+    if uris:
+        arguments = _FILE_VAR_RE.sub(lambda m: uris.get(m.group(1), m.group(0)), arguments)
     return arguments
 
 
@@ -957,9 +1056,14 @@ def _replace_cmd_vars(arguments, gwjob):
     arguments : `str`
         Given arguments string with placeholders replaced.
     """
+    # Without any braces there is nothing str.format() could replace or
+    # unescape.
+    if "{" not in arguments and "}" not in arguments:
+        return arguments
+
     replacements = gwjob.cmdvals if gwjob.cmdvals is not None else {}
     try:
-        arguments = arguments.format(**replacements)
+        arguments = arguments.format_map(replacements)
     except KeyError as exc:
         _LOG.error("Could not replace command variables: replacement for %s not provided", str(exc))
         _LOG.debug("arguments: %s\ncmdvals: %s", arguments, replacements)
@@ -986,10 +1090,10 @@ def _handle_job_inputs(generic_workflow: GenericWorkflow, job_name: str, use_sha
     htc_commands : `dict` [`str`, `str`]
         HTCondor commands for the job submission script.
     """
-    htc_commands = {}
     inputs = []
     for gwf_file in generic_workflow.get_job_inputs(job_name, data=True, transfer_only=True):
-        _LOG.debug("src_uri=%s", gwf_file.src_uri)
+        if _LOG.isEnabledFor(logging.DEBUG):
+            _LOG.debug("src_uri=%s", gwf_file.src_uri)
 
         uri = Path(gwf_file.src_uri)
 
@@ -1022,8 +1126,10 @@ def _handle_job_inputs(generic_workflow: GenericWorkflow, job_name: str, use_sha
             else:
                 inputs.append(f"file://{uri}")
 
-    if inputs:
-        htc_commands["transfer_input_files"] = ",".join(inputs)
+    if not inputs:
+        return {}
+    htc_commands = {"transfer_input_files": ",".join(inputs)}
+    if _LOG.isEnabledFor(logging.DEBUG):
         _LOG.debug("transfer_input_files=%s", htc_commands["transfer_input_files"])
     return htc_commands
 
@@ -1166,13 +1272,16 @@ def _get_info_from_schedd(
         Scheduler, local HTCondor job ids are mapped to their respective
         classads.
     """
-    dag_constraint = 'regexp("dagman$", Cmd)'
+    # Put the id comparison first so the (more expensive) regular expression
+    # is evaluated only for the job(s) with the matching id as ClassAd '&&'
+    # short-circuits.
     try:
         cluster_id = int(float(wms_workflow_id))
     except ValueError:
-        dag_constraint += f' && GlobalJobId == "{wms_workflow_id}"'
+        dag_constraint = f'GlobalJobId == "{wms_workflow_id}"'
     else:
-        dag_constraint += f" && ClusterId == {cluster_id}"
+        dag_constraint = f"ClusterId == {cluster_id}"
+    dag_constraint += ' && regexp("dagman$", Cmd)'
 
     # With the current implementation of the condor_* functions the query
     # will always return only one match per Scheduler.
@@ -1446,7 +1555,7 @@ def _add_run_info(wms_path, job):
             with open(subfile, encoding="utf-8") as fh:
                 for line in fh:
                     if line.startswith("+bps_"):
-                        m = re.match(r"\+(bps_[^\s]+)\s*=\s*(.+)$", line)
+                        m = _BPS_ATTR_RE.match(line)
                         if m:
                             _LOG.debug("Matching line: %s", line)
                             job[m.group(1)] = m.group(2).replace('"', "")
@@ -1602,40 +1711,24 @@ def _get_state_counts_from_dag_job(job):
         Keys are the different WMS states and values are counts of jobs
         that are in that WMS state.
     """
-    _LOG.debug("_get_state_counts_from_dag_job: job = %s %s", type(job), len(job))
-    state_counts = dict.fromkeys(WmsStates, 0)
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug("_get_state_counts_from_dag_job: job = %s %s", type(job), len(job))
     if "DAG_NodesReady" in job:
-        state_counts = {
-            WmsStates.UNREADY: job.get("DAG_NodesUnready", 0),
-            WmsStates.READY: job.get("DAG_NodesReady", 0),
-            WmsStates.HELD: job.get("DAG_JobsHeld", 0),
-            WmsStates.SUCCEEDED: job.get("DAG_NodesDone", 0),
-            WmsStates.FAILED: job.get("DAG_NodesFailed", 0),
-            WmsStates.PRUNED: job.get("DAG_NodesFutile", 0),
-            WmsStates.MISFIT: job.get("DAG_NodesPre", 0) + job.get("DAG_NodesPost", 0),
-        }
-        total_jobs = job.get("DAG_NodesTotal")
-        _LOG.debug("_get_state_counts_from_dag_job: from DAG_* keys, total_jobs = %s", total_jobs)
+        count_keys, total_key = _DAG_STATE_COUNT_KEYS, "DAG_NodesTotal"
     elif "NodesFailed" in job:
-        state_counts = {
-            WmsStates.UNREADY: job.get("NodesUnready", 0),
-            WmsStates.READY: job.get("NodesReady", 0),
-            WmsStates.HELD: job.get("JobProcsHeld", 0),
-            WmsStates.SUCCEEDED: job.get("NodesDone", 0),
-            WmsStates.FAILED: job.get("NodesFailed", 0),
-            WmsStates.PRUNED: job.get("NodesFutile", 0),
-            WmsStates.MISFIT: job.get("NodesPre", 0) + job.get("NodesPost", 0),
-        }
-        try:
-            total_jobs = job.get("NodesTotal")
-        except KeyError as ex:
-            _LOG.error("Job missing %s. job = %s", str(ex), job)
-            raise
-        _LOG.debug("_get_state_counts_from_dag_job: from NODES* keys, total_jobs = %s", total_jobs)
+        count_keys, total_key = _NODE_STATE_COUNT_KEYS, "NodesTotal"
+    else:
+        count_keys, total_key = None, None
+
+    if count_keys is not None:
+        state_counts = {state: sum(job.get(key, 0) for key in keys) for state, keys in count_keys}
+        total_jobs = job.get(total_key)
+        _LOG.debug("_get_state_counts_from_dag_job: from %s key, total_jobs = %s", total_key, total_jobs)
     else:
         # With Kerberos job auth and Kerberos bug, if warning would be printed
         # for every DAG.
         _LOG.debug("Can't get job state counts %s", job["Iwd"])
+        state_counts = dict.fromkeys(WmsStates, 0)
         total_jobs = 0
 
     _LOG.debug("total_jobs = %s, state_counts: %s", total_jobs, state_counts)
@@ -1677,20 +1770,16 @@ def _htc_job_status_to_wms_state(job):
     wms_state : `lsst.ctrl.bps.WmsStates`
         The equivalent WmsState to given job's status.
     """
-    _LOG.debug(
-        "htc_job_status_to_wms_state: %s=%s, %s", job["ClusterId"], job["JobStatus"], type(job["JobStatus"])
-    )
     job_status = int(job["JobStatus"])
-    wms_state = WmsStates.MISFIT
-
-    _LOG.debug("htc_job_status_to_wms_state: job_status = %s", job_status)
-    if job_status == JobStatus.IDLE:
-        wms_state = WmsStates.PENDING
-    elif job_status == JobStatus.RUNNING:
-        wms_state = WmsStates.RUNNING
-    elif job_status == JobStatus.REMOVED:
-        wms_state = WmsStates.DELETED
-    elif job_status == JobStatus.COMPLETED:
+    if _LOG.isEnabledFor(logging.DEBUG):
+        _LOG.debug(
+            "htc_job_status_to_wms_state: %s=%s, %s",
+            job["ClusterId"],
+            job["JobStatus"],
+            type(job["JobStatus"]),
+        )
+        _LOG.debug("htc_job_status_to_wms_state: job_status = %s", job_status)
+    if job_status == JobStatus.COMPLETED:
         if (
             (job.get("ExitBySignal", False) and job.get("ExitSignal", 0))
             or job.get("ExitCode", 0)
@@ -1699,8 +1788,8 @@ def _htc_job_status_to_wms_state(job):
             wms_state = WmsStates.FAILED
         else:
             wms_state = WmsStates.SUCCEEDED
-    elif job_status == JobStatus.HELD:
-        wms_state = WmsStates.HELD
+    else:
+        wms_state = _JOB_STATUS_TO_WMS_STATE.get(job_status, WmsStates.MISFIT)
 
     return wms_state
 
@@ -1824,7 +1913,7 @@ def _wms_id_to_cluster(wms_id):
         cluster_id = int(float(wms_id))
     elif id_type == WmsIdType.GLOBAL:
         constraint = f'GlobalJobId == "{wms_id}"'
-        schedd_ads = {ad["Name"]: ad for ad in coll.locateAll(htcondor.DaemonTypes.Schedd)}
+        schedd_ads = {ad["Name"]: ad for ad in _locate_global_id_schedds(coll, wms_id)}
         schedds = {name: htcondor.Schedd(ad) for name, ad in schedd_ads.items()}
         job_info = condor_q(constraint=constraint, schedds=schedds)
         if job_info:
@@ -1884,13 +1973,13 @@ def _wms_id_to_dir(wms_id):
             schedd_ads.append(coll.locate(htcondor.DaemonTypes.Schedd))
         case WmsIdType.GLOBAL:
             constraint = f'GlobalJobId == "{wms_id}"'
-            schedd_ads.extend(coll.locateAll(htcondor.DaemonTypes.Schedd))
+            schedd_ads.extend(_locate_global_id_schedds(coll, wms_id))
         case WmsIdType.PATH:
             wms_path = Path(wms_id).resolve()
         case WmsIdType.UNKNOWN:
             raise TypeError(f"Invalid job id type: {wms_id}")
     if constraint is not None:
-        schedds = {ad["name"]: htcondor.Schedd(ad) for ad in schedd_ads}
+        schedds = {ad["Name"]: htcondor.Schedd(ad) for ad in schedd_ads}
         job_info = condor_history(constraint=constraint, schedds=schedds, projection=["Iwd"])
         if job_info:
             _, job_rec = job_info.popitem()
@@ -1899,6 +1988,71 @@ def _wms_id_to_dir(wms_id):
     return wms_path, id_type
 
 
+@functools.lru_cache
+def _create_memory_scaling_cmds(memory, multiplier, limit):
+    """Construct HTCondor job commands enabling memory autoscaling.
+
+    Jobs in a workflow usually share only a handful of distinct memory
+    settings, so the results are cached to avoid building the same, lengthy
+    ClassAd expressions for every job.
+
+    Parameters
+    ----------
+    memory : `int`
+        Requested memory in MB.
+    multiplier : `float`
+        Memory growth rate between retries.
+    limit : `int`
+        Memory limit.
+
+    Returns
+    -------
+    cmds : `types.MappingProxyType` [`str`, `str`]
+        HTCondor job commands (``request_memory``, ``periodic_release``, and
+        ``periodic_remove``). The mapping is shared between the calls with
+        the same arguments so it is read-only.
+    """
+    cmds = {
+        # Make job ask for more memory each time it failed due to insufficient
+        # memory requirements.
+        "request_memory": _create_request_memory_expr(memory, multiplier, limit),
+        # Periodically release jobs which are being held due to exceeding
+        # memory. Stop doing that (by removing the job from the HTCondor
+        # queue) after the maximal number of retries has been reached or
+        # the job was already run at maximal allowed memory.
+        "periodic_release": _create_periodic_release_expr(memory, multiplier, limit),
+        "periodic_remove": _create_periodic_remove_expr(memory, multiplier, limit),
+    }
+    return types.MappingProxyType(cmds)
+
+
+def _create_memory_growth_expr(memory, multiplier, limit, last_run=False):
+    """Construct an HTCondor ClassAd expression for the memory requested
+    by a job after a given number of run attempts.
+
+    Parameters
+    ----------
+    memory : `int`
+        Requested memory in MB.
+    multiplier : `float`
+        Memory growth rate between retries.
+    limit : `int`
+        Memory limit.
+    last_run : `bool`, optional
+        If True, the expression gives the memory requested during the last
+        run attempt instead of the one the job should request now. Defaults
+        to False.
+
+    Returns
+    -------
+    expr : `str`
+        A string representing an HTCondor ClassAd expression for the memory
+        requested by a job, capped at the memory limit.
+    """
+    exponent = "NumJobStarts - 1" if last_run else "NumJobStarts"
+    return f"min({{int({memory} * pow({multiplier}, {exponent})), {limit}}})"
+
+
 def _create_periodic_release_expr(memory, multiplier, limit):
     """Construct an HTCondorAd expression for releasing held jobs.
 
@@ -1915,7 +2069,7 @@ def _create_periodic_release_expr(memory, multiplier, limit):
     memory : `int`
         Requested memory in MB.
     multiplier : `float`
-        Memory growth rate between retires.
+        Memory growth rate between retries.
     limit : `int`
         Memory limit.
 
@@ -1926,25 +2080,9 @@ def _create_periodic_release_expr(memory, multiplier, limit):
         which have been held due to exceeding the memory requirements.
     """
     is_retry_allowed = "NumJobStarts <= JobMaxRetries"
-    was_below_limit = f"min({{int({memory} * pow({multiplier}, NumJobStarts - 1)), {limit}}}) < {limit}"
-
-    # Job ClassAds attributes 'HoldReasonCode' and 'HoldReasonSubCode' are
-    # UNDEFINED if job is not HELD (i.e. when 'JobStatus' is not 5).
-    # The special comparison operators ensure that all comparisons below will
-    # evaluate to FALSE in this case.
-    #
-    # Note:
-    # May not be strictly necessary. Operators '&&' and '||' are not strict so
-    # the entire expression should evaluate to FALSE when the job is not HELD.
-    # According to ClassAd evaluation semantics FALSE && UNDEFINED is FALSE,
-    # but better safe than sorry.
-    was_mem_exceeded = (
-        "JobStatus == 5 "
-        "&& (HoldReasonCode =?= 34 && HoldReasonSubCode =?= 0 "
-        "|| HoldReasonCode =?= 3 && HoldReasonSubCode =?= 34)"
-    )
+    was_below_limit = f"{_create_memory_growth_expr(memory, multiplier, limit, last_run=True)} < {limit}"
 
-    expr = f"{was_mem_exceeded} && {is_retry_allowed} && {was_below_limit}"
+    expr = f"{_WAS_MEM_EXCEEDED_EXPR} && {is_retry_allowed} && {was_below_limit}"
     return expr
 
 
@@ -1964,7 +2102,7 @@ def _create_periodic_remove_expr(memory, multiplier, limit):
     memory : `int`
         Requested memory in MB.
     multiplier : `float`
-        Memory growth rate between retires.
+        Memory growth rate between retries.
     limit : `int`
         Memory limit.
 
@@ -1976,25 +2114,9 @@ def _create_periodic_remove_expr(memory, multiplier, limit):
         the memory requirements.
     """
     is_retry_disallowed = "NumJobStarts > JobMaxRetries"
-    was_limit_reached = f"min({{int({memory} * pow({multiplier}, NumJobStarts - 1)), {limit}}}) == {limit}"
+    was_limit_reached = f"{_create_memory_growth_expr(memory, multiplier, limit, last_run=True)} == {limit}"
 
-    # Job ClassAds attributes 'HoldReasonCode' and 'HoldReasonSubCode' are
-    # UNDEFINED if job is not HELD (i.e. when 'JobStatus' is not 5).
-    # The special comparison operators ensure that all comparisons below will
-    # evaluate to FALSE in this case.
-    #
-    # Note:
-    # May not be strictly necessary. Operators '&&' and '||' are not strict so
-    # the entire expression should evaluate to FALSE when the job is not HELD.
-    # According to ClassAd evaluation semantics FALSE && UNDEFINED is FALSE,
-    # but better safe than sorry.
-    was_mem_exceeded = (
-        "JobStatus == 5 "
-        "&& (HoldReasonCode =?= 34 && HoldReasonSubCode =?= 0 "
-        "|| HoldReasonCode =?= 3 && HoldReasonSubCode =?= 34)"
-    )
-
-    expr = f"{was_mem_exceeded} && ({is_retry_disallowed} || {was_limit_reached})"
+    expr = f"{_WAS_MEM_EXCEEDED_EXPR} && ({is_retry_disallowed} || {was_limit_reached})"
     return expr
 
 
@@ -2006,7 +2128,7 @@ def _create_request_memory_expr(memory, multiplier, limit):
     memory : `int`
         Requested memory in MB.
     multiplier : `float`
-        Memory growth rate between retires.
+        Memory growth rate between retries.
     limit : `int`
         Memory limit.
 
@@ -2016,32 +2138,45 @@ def _create_request_memory_expr(memory, multiplier, limit):
         A string representing an HTCondor ClassAd expression enabling safe
         memory scaling between job retries.
     """
-    # The check if the job was held due to exceeding memory requirements
-    # will be made *after* job was released back to the job queue (is in
-    # the IDLE state), hence the need to use `Last*` job ClassAds instead of
-    # the ones describing job's current state.
-    #
-    # Also, 'Last*' job ClassAds attributes are UNDEFINED when a job is
-    # initially put in the job queue. The special comparison operators ensure
-    # that all comparisons below will evaluate to FALSE in this case.
-    was_mem_exceeded = (
-        "LastJobStatus =?= 5 "
-        "&& (LastHoldReasonCode =?= 34 && LastHoldReasonSubCode =?= 0 "
-        "|| LastHoldReasonCode =?= 3 && LastHoldReasonSubCode =?= 34)"
-    )
-
     # If job runs the first time or was held for reasons other than exceeding
     # the memory, set the required memory to the requested value or use
     # the memory value measured by HTCondor (MemoryUsage) depending on
     # whichever is greater.
     expr = (
-        f"({was_mem_exceeded}) "
-        f"? min({{int({memory} * pow({multiplier}, NumJobStarts)), {limit}}}) "
+        f"({_LAST_WAS_MEM_EXCEEDED_EXPR}) "
+        f"? {_create_memory_growth_expr(memory, multiplier, limit)} "
         f": max({{{memory}, MemoryUsage ?: 0}})"
     )
     return expr
 
 
+def _locate_global_id_schedds(coll, global_id):
+    """Find out Scheduler daemons which may manage a job with a given global
+    id.
+
+    Parameters
+    ----------
+    coll : `htcondor.Collector`
+        Object representing HTCondor collector daemon.
+    global_id : `str`
+        HTCondor global job id (``<schedd name>#<cluster>.<proc>#<time>``).
+
+    Returns
+    -------
+    schedd_ads : `list` [`classad.ClassAd`]
+        ClassAds describing the Scheduler named in the global job id or, if it
+        cannot be located, all Schedulers in the pool.
+    """
+    # The global job id starts with the name of the Scheduler managing
+    # the job, so there is no need to query every Scheduler in the pool.
+    schedd_name = global_id.split("#", 1)[0]
+    try:
+        return [coll.locate(htcondor.DaemonTypes.Schedd, schedd_name)]
+    except htcondor.HTCondorLocateError:
+        _LOG.debug("Scheduler '%s' not found, will search all Schedulers", schedd_name)
+        return list(coll.locateAll(htcondor.DaemonTypes.Schedd))
+
+
 def _locate_schedds(locate_all=False):
     """Find out Scheduler daemons in an HTCondor pool.
 
@@ -2068,7 +2203,7 @@ def _locate_schedds(locate_all=False):
     return {ad["Name"]: htcondor.Schedd(ad) for ad in schedd_ads}
 
 
-def _gather_site_values(config, compute_site):
+def _gather_site_values(config, compute_site, pool_memory_limits=None):
     """Gather values specific to given site.
 
     Parameters
@@ -2078,6 +2213,10 @@ def _gather_site_values(config, compute_site):
         information.
     compute_site : `str`
         Compute site name.
+    pool_memory_limits : `dict` [`str`, `int`], optional
+        Cache of memory limits already found in the HTCondor pool keyed by
+        the execute machines pattern. It will be updated if the pool had to
+        be queried. If None (default), the pool is always queried.
 
     Returns
     -------
@@ -2096,15 +2235,20 @@ def _gather_site_values(config, compute_site):
         _, patt = config.search("executeMachinesPattern", opt=search_opts)
         del search_opts["default"]
 
-        # To reduce the amount of data, ignore dynamic slots (if any) as,
-        # by definition, they cannot have more memory than
-        # the partitionable slot they are the part of.
-        constraint = f'SlotType != "Dynamic" && regexp("{patt}", Machine)'
-        pool_info = condor_status(constraint=constraint)
-        try:
-            limit = max(int(info["TotalSlotMemory"]) for info in pool_info.values())
-        except ValueError:
-            _LOG.debug("No execute machine in the pool matches %s", patt)
+        if pool_memory_limits is not None and patt in pool_memory_limits:
+            limit = pool_memory_limits[patt]
+        else:
+            # To reduce the amount of data, ignore dynamic slots (if any) as,
+            # by definition, they cannot have more memory than
+            # the partitionable slot they are the part of.
+            constraint = f'SlotType != "Dynamic" && regexp("{patt}", Machine)'
+            pool_info = condor_status(constraint=constraint)
+            try:
+                limit = max(int(info["TotalSlotMemory"]) for info in pool_info.values())
+            except ValueError:
+                _LOG.debug("No execute machine in the pool matches %s", patt)
+            if pool_memory_limits is not None:
+                pool_memory_limits[patt] = limit
     if limit:
         config[".bps_defined.memory_limit"] = limit
 
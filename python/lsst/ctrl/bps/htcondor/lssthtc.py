@@ -817,7 +817,9 @@ class HTCJob:
         submit_path : `str`
             Prefix path for the submit file.
         job_subdir : `str`, optional
-            Template for job subdir.
+            Template for job subdir. It is formatted with the job bound to
+            ``self`` (e.g., ``"jobs/{self.label}"``) and used only if the job
+            has no submit file set yet.
         """
         if not self.subfile:
             self.subfile = f"{self.name}.sub"
@@ -30,6 +30,7 @@
 __all__ = ["Provisioner"]
 
 import logging
+import os
 from pathlib import Path
 from typing import Any
 
@@ -160,7 +161,8 @@ class Provisioner:
         _LOG.debug("Writing provisioning script to %s", self.script_file)
         with open(self.script_file, mode="w", encoding="utf8") as file:
             file.write(script_content)
-        self.script_file.chmod(0o755)
+            # Use the already open file to avoid resolving the path again.
+            os.fchmod(file.fileno(), 0o755)
 
         self.is_prepared = True
 
@@ -193,9 +195,11 @@ class Provisioner:
             "should_transfer_files": "NO",
             "getenv": "True",
         }
+        stream_prefix = f"{job.subfile.with_suffix('')}.$(Cluster)"
         cmds |= {
-            stream: str(job.subfile.with_suffix(f".$(Cluster).{stream[:3]}"))
-            for stream in ("output", "error", "log")
+            "output": f"{stream_prefix}.out",
+            "error": f"{stream_prefix}.err",
+            "log": f"{stream_prefix}.log",
         }
         job.add_job_cmds(cmds)
 
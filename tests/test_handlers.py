@@ -92,6 +92,13 @@ class ChainTestCase(unittest.TestCase):
         with self.assertRaises(TypeError):
             chain.append(handler)
 
+    def testHandlingRaisingHandler(self):
+        chain = Chain(handlers=[RaisingHandler()])
+        with self.assertLogs(logger=logger, level="WARNING") as cm:
+            result = chain.handle({})
+        self.assertIsNone(result)
+        self.assertIn("RaisingHandler", cm.output[0])
+
 
 class JobCompletedWithExecTicketHandlerTestCase(unittest.TestCase):
     """Test the handler for a completed job with the ticket of execution."""
@@ -27,27 +27,46 @@
 
 """Unit tests for the HTCondor WMS service class and related functions."""
 
+import contextlib
 import logging
 import os
+import tempfile
+import types
 import unittest
 from pathlib import Path
-from shutil import copy2
+from shutil import copyfile
 
 import htcondor
-from lsst.ctrl.bps import BpsConfig, GenericWorkflowExec, GenericWorkflowJob, WmsStates
+from lsst.ctrl.bps import (
+    BpsConfig,
+    GenericWorkflow,
+    GenericWorkflowExec,
+    GenericWorkflowFile,
+    GenericWorkflowJob,
+    WmsStates,
+)
 from lsst.ctrl.bps.htcondor.htcondor_config import HTC_DEFAULTS_URI
 from lsst.ctrl.bps.htcondor.htcondor_service import (
     HTCondorService,
     JobStatus,
     NodeStatus,
     WmsIdType,
+    _add_run_info,
+    _create_memory_scaling_cmds,
+    _fix_env_var_syntax,
+    _gather_site_values,
     _get_exit_code_summary,
     _get_info_from_path,
     _get_state_counts_from_dag_job,
+    _handle_job_inputs,
     _htc_node_status_to_wms_state,
     _htc_status_to_wms_state,
+    _locate_global_id_schedds,
+    _replace_cmd_vars,
+    _replace_file_vars,
     _translate_job_cmds,
     _wms_id_to_dir,
+    is_service_job,
 )
 from lsst.ctrl.bps.htcondor.lssthtc import MISSING_ID
 from lsst.utils.tests import temporaryDirectory
@@ -55,6 +74,7 @@ from lsst.utils.tests import temporaryDirectory
 logger = logging.getLogger("lsst.ctrl.bps.htcondor")
 
 TESTDIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = Path(TESTDIR, "data")
 
 LOCATE_SUCCESS = """[
         CondorPlatform = "$CondorPlatform: X86_64-CentOS_7.9 $";
@@ -80,15 +100,39 @@ PING_SUCCESS = """[
 """
 
 
+def _stage(src, dst_dir):
+    """Make a read-only test data file available in a directory.
+
+    Hard links avoid copying the data; fall back to a copy when linking
+    is not possible (e.g., the directory is on a different device).  The
+    tests do not care about file metadata, so it is not copied.
+    """
+    dst = os.path.join(dst_dir, os.path.basename(src))
+    try:
+        os.link(src, dst)
+    except OSError:
+        copyfile(src, dst)
+
+
 class HTCondorServiceTestCase(unittest.TestCase):
     """Test selected methods of the HTCondor WMS service class."""
 
-    def setUp(self):
+    @classmethod
+    def setUpClass(cls):
+        # The tests only read from the service, so one instance is enough.
         config = BpsConfig({}, wms_service_class_fqn="lsst.ctrl.bps.htcondor.HTCondorService")
-        self.service = HTCondorService(config)
+        cls.service = HTCondorService(config)
+        cls.locate_mock = cls.enterClassContext(
+            unittest.mock.patch.object(htcondor.Collector, "locate", return_value=LOCATE_SUCCESS)
+        )
+        cls.ping_mock = cls.enterClassContext(
+            unittest.mock.patch.object(htcondor.SecMan, "ping", return_value=PING_SUCCESS)
+        )
 
-    def tearDown(self):
-        pass
+    def setUp(self):
+        # Undo any failure a previous test injected into the shared mocks.
+        self.locate_mock.side_effect = None
+        self.ping_mock.side_effect = None
 
     def testDefaults(self):
         self.assertEqual(self.service.defaults["memoryLimit"], 491520)
@@ -97,34 +141,29 @@ class HTCondorServiceTestCase(unittest.TestCase):
         self.assertEqual(self.service.defaults_uri, HTC_DEFAULTS_URI)
         self.assertFalse(self.service.defaults_uri.isdir())
 
-    @unittest.mock.patch.object(htcondor.Collector, "locate", return_value=LOCATE_SUCCESS)
-    @unittest.mock.patch.object(htcondor.SecMan, "ping", return_value=PING_SUCCESS)
-    def testPingSuccess(self, mock_locate, mock_ping):
+    def testPingSuccess(self):
         status, message = self.service.ping(None)
         self.assertEqual(status, 0)
         self.assertEqual(message, "")
 
     def testPingFailure(self):
-        with unittest.mock.patch("htcondor.Collector.locate") as locate_mock:
-            locate_mock.side_effect = htcondor.HTCondorLocateError()
-            status, message = self.service.ping(None)
-            self.assertEqual(status, 1)
-            self.assertEqual(message, "Could not locate Schedd service.")
+        self.locate_mock.side_effect = htcondor.HTCondorLocateError()
+        status, message = self.service.ping(None)
+        self.assertEqual(status, 1)
+        self.assertEqual(message, "Could not locate Schedd service.")
 
-    @unittest.mock.patch.object(htcondor.Collector, "locate", return_value=LOCATE_SUCCESS)
-    def testPingPermission(self, mock_locate):
-        with unittest.mock.patch("htcondor.SecMan.ping") as ping_mock:
-            ping_mock.side_effect = htcondor.HTCondorIOError()
-            status, message = self.service.ping(None)
-            self.assertEqual(status, 1)
-            self.assertEqual(message, "Permission problem with Schedd service.")
+    def testPingPermission(self):
+        self.ping_mock.side_effect = htcondor.HTCondorIOError()
+        status, message = self.service.ping(None)
+        self.assertEqual(status, 1)
+        self.assertEqual(message, "Permission problem with Schedd service.")
 
 
 class GetExitCodeSummaryTestCase(unittest.TestCase):
     """Test the function responsible for creating exit code summary."""
 
-    def setUp(self):
-        self.jobs = {
+    JOBS = types.MappingProxyType(
+        {
             "1.0": {
                 "JobStatus": htcondor.JobStatus.IDLE,
                 "bps_job_label": "foo",
@@ -170,12 +209,10 @@ class GetExitCodeSummaryTestCase(unittest.TestCase):
                 "bps_job_label": "qux",
             },
         }
-
-    def tearDown(self):
-        pass
+    )
 
     def testMainScenario(self):
-        actual = _get_exit_code_summary(self.jobs)
+        actual = _get_exit_code_summary(self.JOBS)
         expected = {"foo": [], "bar": [1], "baz": [11, 42], "qux": []}
         self.assertEqual(actual, expected)
 
@@ -210,95 +247,95 @@ class GetExitCodeSummaryTestCase(unittest.TestCase):
 class HtcNodeStatusToWmsStateTestCase(unittest.TestCase):
     """Test assigning WMS state base on HTCondor node status."""
 
-    def setUp(self):
-        pass
-
-    def tearDown(self):
-        pass
-
-    def testNotReady(self):
-        job = {"NodeStatus": NodeStatus.NOT_READY}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.UNREADY)
-
-    def testReady(self):
-        job = {"NodeStatus": NodeStatus.READY}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.READY)
-
-    def testPrerun(self):
-        job = {"NodeStatus": NodeStatus.PRERUN}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.MISFIT)
-
-    def testSubmittedHeld(self):
-        job = {
-            "NodeStatus": NodeStatus.SUBMITTED,
-            "JobProcsHeld": 1,
-            "StatusDetails": "",
-            "JobProcsQueued": 0,
-        }
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.HELD)
-
-    def testSubmittedRunning(self):
-        job = {
-            "NodeStatus": NodeStatus.SUBMITTED,
-            "JobProcsHeld": 0,
-            "StatusDetails": "not_idle",
-            "JobProcsQueued": 0,
-        }
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.RUNNING)
-
-    def testSubmittedPending(self):
-        job = {
-            "NodeStatus": NodeStatus.SUBMITTED,
-            "JobProcsHeld": 0,
-            "StatusDetails": "",
-            "JobProcsQueued": 1,
-        }
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.PENDING)
-
-    def testPostrun(self):
-        job = {"NodeStatus": NodeStatus.POSTRUN}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.MISFIT)
-
-    def testDone(self):
-        job = {"NodeStatus": NodeStatus.DONE}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.SUCCEEDED)
-
-    def testErrorDagmanSuccess(self):
-        job = {"NodeStatus": NodeStatus.ERROR, "StatusDetails": "DAGMAN error 0"}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.SUCCEEDED)
-
-    def testErrorDagmanFailure(self):
-        job = {"NodeStatus": NodeStatus.ERROR, "StatusDetails": "DAGMAN error 1"}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.FAILED)
-
-    def testFutile(self):
-        job = {"NodeStatus": NodeStatus.FUTILE}
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.PRUNED)
+    CASES = (
+        ("NotReady", {"NodeStatus": NodeStatus.NOT_READY}, WmsStates.UNREADY),
+        ("Ready", {"NodeStatus": NodeStatus.READY}, WmsStates.READY),
+        ("Prerun", {"NodeStatus": NodeStatus.PRERUN}, WmsStates.MISFIT),
+        (
+            "SubmittedHeld",
+            {
+                "NodeStatus": NodeStatus.SUBMITTED,
+                "JobProcsHeld": 1,
+                "StatusDetails": "",
+                "JobProcsQueued": 0,
+            },
+            WmsStates.HELD,
+        ),
+        (
+            "SubmittedRunning",
+            {
+                "NodeStatus": NodeStatus.SUBMITTED,
+                "JobProcsHeld": 0,
+                "StatusDetails": "not_idle",
+                "JobProcsQueued": 0,
+            },
+            WmsStates.RUNNING,
+        ),
+        (
+            "SubmittedPending",
+            {
+                "NodeStatus": NodeStatus.SUBMITTED,
+                "JobProcsHeld": 0,
+                "StatusDetails": "",
+                "JobProcsQueued": 1,
+            },
+            WmsStates.PENDING,
+        ),
+        ("Postrun", {"NodeStatus": NodeStatus.POSTRUN}, WmsStates.MISFIT),
+        ("Done", {"NodeStatus": NodeStatus.DONE}, WmsStates.SUCCEEDED),
+        (
+            "ErrorDagmanSuccess",
+            {"NodeStatus": NodeStatus.ERROR, "StatusDetails": "DAGMAN error 0"},
+            WmsStates.SUCCEEDED,
+        ),
+        (
+            "ErrorDagmanFailure",
+            {"NodeStatus": NodeStatus.ERROR, "StatusDetails": "DAGMAN error 1"},
+            WmsStates.FAILED,
+        ),
+        ("Futile", {"NodeStatus": NodeStatus.FUTILE}, WmsStates.PRUNED),
+        (
+            "DeletedJob",
+            {
+                "NodeStatus": NodeStatus.ERROR,
+                "StatusDetails": "HTCondor reported ULOG_JOB_ABORTED event for job proc (1.0.0)",
+                "JobProcsQueued": 0,
+            },
+            WmsStates.DELETED,
+        ),
+    )
 
-    def testDeletedJob(self):
-        job = {
-            "NodeStatus": NodeStatus.ERROR,
-            "StatusDetails": "HTCondor reported ULOG_JOB_ABORTED event for job proc (1.0.0)",
-            "JobProcsQueued": 0,
-        }
-        result = _htc_node_status_to_wms_state(job)
-        self.assertEqual(result, WmsStates.DELETED)
+    def testNodeStatusMapping(self):
+        for name, job, expected in self.CASES:
+            with self.subTest(name=name):
+                self.assertEqual(_htc_node_status_to_wms_state(job), expected)
 
 
 class HtcStatusToWmsStateTestCase(unittest.TestCase):
     """Test assigning WMS state base on HTCondor status."""
 
+    RETRY_SUCCESS_JOB = types.MappingProxyType(
+        {
+            "NodeStatus": 5,
+            "Node": "8e62c569-ae2e-44e8-be36-d1aee333a129_isr_903342_10",
+            "RetryCount": 0,
+            "ClusterId": 851,
+            "ProcId": 0,
+            "MyType": "JobTerminatedEvent",
+            "EventTypeNumber": 5,
+            "HoldReasonCode": 3,
+            "HoldReason": "Job raised a signal 9. Handling signal as if job has gone over memory limit.",
+            "HoldReasonSubCode": 34,
+            "ToE": {
+                "ExitBySignal": False,
+                "ExitCode": 0,
+            },
+            "JobStatus": JobStatus.COMPLETED,
+            "ExitBySignal": False,
+            "ExitCode": 0,
+        }
+    )
+
     def testJobStatus(self):
         job = {
             "ClusterId": 1,
@@ -308,6 +345,24 @@ class HtcStatusToWmsStateTestCase(unittest.TestCase):
         result = _htc_status_to_wms_state(job)
         self.assertEqual(result, WmsStates.PENDING)
 
+    def testJobStatusMapping(self):
+        truth = {
+            JobStatus.IDLE: WmsStates.PENDING,
+            JobStatus.RUNNING: WmsStates.RUNNING,
+            JobStatus.REMOVED: WmsStates.DELETED,
+            JobStatus.HELD: WmsStates.HELD,
+            JobStatus.TRANSFERRING_OUTPUT: WmsStates.MISFIT,
+        }
+        for status, state in truth.items():
+            with self.subTest(status=status):
+                self.assertEqual(_htc_status_to_wms_state({"ClusterId": 1, "JobStatus": status}), state)
+
+    def testJobStatusCompleted(self):
+        job = {"ClusterId": 1, "JobStatus": JobStatus.COMPLETED, "ExitCode": 0}
+        self.assertEqual(_htc_status_to_wms_state(job), WmsStates.SUCCEEDED)
+        job["ExitCode"] = 1
+        self.assertEqual(_htc_status_to_wms_state(job), WmsStates.FAILED)
+
     def testNodeStatus(self):
         # Hold/Release test case
         job = {
@@ -327,34 +382,19 @@ class HtcStatusToWmsStateTestCase(unittest.TestCase):
         self.assertEqual(result, WmsStates.MISFIT)
 
     def testRetrySuccess(self):
-        job = {
-            "NodeStatus": 5,
-            "Node": "8e62c569-ae2e-44e8-be36-d1aee333a129_isr_903342_10",
-            "RetryCount": 0,
-            "ClusterId": 851,
-            "ProcId": 0,
-            "MyType": "JobTerminatedEvent",
-            "EventTypeNumber": 5,
-            "HoldReasonCode": 3,
-            "HoldReason": "Job raised a signal 9. Handling signal as if job has gone over memory limit.",
-            "HoldReasonSubCode": 34,
-            "ToE": {
-                "ExitBySignal": False,
-                "ExitCode": 0,
-            },
-            "JobStatus": JobStatus.COMPLETED,
-            "ExitBySignal": False,
-            "ExitCode": 0,
-        }
-        result = _htc_status_to_wms_state(job)
+        result = _htc_status_to_wms_state(self.RETRY_SUCCESS_JOB)
         self.assertEqual(result, WmsStates.SUCCEEDED)
 
 
 class TranslateJobCmdsTestCase(unittest.TestCase):
     """Test _translate_job_cmds method."""
 
+    @classmethod
+    def setUpClass(cls):
+        # The executable is never modified by _translate_job_cmds.
+        cls.gw_exec = GenericWorkflowExec("test_exec", "/dummy/dir/pipetask")
+
     def setUp(self):
-        self.gw_exec = GenericWorkflowExec("test_exec", "/dummy/dir/pipetask")
         self.cached_vals = {"profile": {}}
 
     def testRetryUnlessNone(self):
@@ -382,18 +422,230 @@ class TranslateJobCmdsTestCase(unittest.TestCase):
             _ = _translate_job_cmds(self.cached_vals, None, gwjob)
         self.assertIn("retryUnlessExit", str(cm.exception))
 
+    def testMemoryAutoscaling(self):
+        cached_vals = self.cached_vals | {"memoryLimit": 8192}
+        gwjob = GenericWorkflowJob("memoryScaling", label="label1", executable=self.gw_exec)
+        gwjob.request_memory = 2048
+        gwjob.memory_multiplier = 2.0
+        htc_commands = _translate_job_cmds(cached_vals, None, gwjob)
+        self.assertIn("int(2048 * pow(2.0, NumJobStarts)), 8192", htc_commands["request_memory"])
+        self.assertIn("NumJobStarts <= JobMaxRetries", htc_commands["periodic_release"])
+        self.assertIn("NumJobStarts > JobMaxRetries", htc_commands["periodic_remove"])
+
+        other = GenericWorkflowJob("memoryScalingOther", label="label1", executable=self.gw_exec)
+        other.request_memory = 2048
+        other.memory_multiplier = 2.0
+        other_commands = _translate_job_cmds(cached_vals, None, other)
+        for key in ("request_memory", "periodic_release", "periodic_remove"):
+            self.assertEqual(other_commands[key], htc_commands[key])
+
+    def testMemoryScalingCmdsReadOnly(self):
+        cmds = _create_memory_scaling_cmds(2048, 2.0, 8192)
+        self.assertIs(cmds, _create_memory_scaling_cmds(2048, 2.0, 8192))
+        with self.assertRaises(TypeError):
+            cmds["request_memory"] = "4096"
+
+    def testMemoryAutoscalingNoLimit(self):
+        cached_vals = self.cached_vals | {"memoryLimit": ""}
+        gwjob = GenericWorkflowJob("memoryScaling", label="label1", executable=self.gw_exec)
+        gwjob.request_memory = 2048
+        gwjob.memory_multiplier = 2.0
+        with self.assertRaises(RuntimeError):
+            _translate_job_cmds(cached_vals, None, gwjob)
+
+
+class AddRunInfoTestCase(unittest.TestCase):
+    """Test _add_run_info function."""
+
+    def testAttributes(self):
+        with temporaryDirectory() as tmp_dir:
+            subdir = Path(tmp_dir) / "jobs" / "label1"
+            subdir.mkdir(parents=True)
+            (subdir / "job1.sub").write_text(
+                'universe = vanilla\n+bps_run = "u_test_run"\n+bps_isjob = "true"\n+bps_bad\n'
+            )
+            job = {}
+            _add_run_info(tmp_dir, job)
+        self.assertEqual(job, {"bps_run": "u_test_run", "bps_isjob": "true"})
+
+    def testMissingSubmitFile(self):
+        with temporaryDirectory() as tmp_dir:
+            job = {}
+            _add_run_info(tmp_dir, job)
+        self.assertEqual(job, {"bps_run": "Unavailable"})
 
-class GetStateCountsFromDagJobTestCase(unittest.TestCase):
-    """Test counting number of jobs per WMS state."""
+
+class FixEnvVarSyntaxTestCase(unittest.TestCase):
+    """Test _fix_env_var_syntax function."""
+
+    def testNoPlaceholders(self):
+        self.assertEqual(_fix_env_var_syntax("--foo bar"), "--foo bar")
+
+    def testPlaceholders(self):
+        result = _fix_env_var_syntax("<ENV:HOME>/a <ENV:FOO_BAR> <ENV:HOME>/b")
+        self.assertEqual(result, "$ENV(HOME)/a $ENV(FOO_BAR) $ENV(HOME)/b")
+
+
+class GatherSiteValuesTestCase(unittest.TestCase):
+    """Test _gather_site_values function."""
 
     def setUp(self):
-        pass
+        self.config = BpsConfig({})
+        self.pool_info = {
+            "slot1@node1": {"TotalSlotMemory": 2048},
+            "slot1@node2": {"TotalSlotMemory": 4096},
+        }
 
-    def tearDown(self):
-        pass
+    def testMemoryLimitFromPool(self):
+        with unittest.mock.patch(
+            "lsst.ctrl.bps.htcondor.htcondor_service.condor_status", return_value=self.pool_info
+        ) as status_mock:
+            site_values = _gather_site_values(self.config, "site1")
+        self.assertEqual(site_values["memoryLimit"], 4096)
+        status_mock.assert_called_once()
+
+    def testMemoryLimitCaching(self):
+        pool_memory_limits = {}
+        with unittest.mock.patch(
+            "lsst.ctrl.bps.htcondor.htcondor_service.condor_status", return_value=self.pool_info
+        ) as status_mock:
+            first = _gather_site_values(self.config, "site1", pool_memory_limits)
+            second = _gather_site_values(self.config, "site2", pool_memory_limits)
+        self.assertEqual(first["memoryLimit"], 4096)
+        self.assertEqual(second["memoryLimit"], 4096)
+        status_mock.assert_called_once()
+
+
+class HandleJobInputsTestCase(unittest.TestCase):
+    """Test _handle_job_inputs function."""
 
-    def testCounts(self):
-        job = {
+    def setUp(self):
+        self.gwjob = GenericWorkflowJob("job1", label="label1")
+        self.workflow = GenericWorkflow("test")
+        self.workflow.add_job(self.gwjob)
+
+    def testPush(self):
+        self.workflow.add_job_inputs(
+            self.gwjob.name, [GenericWorkflowFile("in1", src_uri="/submit/inputs/in1.txt", wms_transfer=True)]
+        )
+        result = _handle_job_inputs(self.workflow, self.gwjob.name, False, "/submit")
+        self.assertEqual(result, {"transfer_input_files": "inputs/in1.txt"})
+
+    def testSharedCopies(self):
+        self.workflow.add_job_inputs(
+            self.gwjob.name,
+            [
+                GenericWorkflowFile("in1", src_uri="/shared/in1.txt", wms_transfer=True),
+                GenericWorkflowFile("in2", src_uri="/shared/in2.txt", wms_transfer=True, job_shared=True),
+                GenericWorkflowFile("butlerConfig", src_uri="/repo", wms_transfer=True),
+            ],
+        )
+        result = _handle_job_inputs(self.workflow, self.gwjob.name, True, "/submit")
+        self.assertEqual(
+            result,
+            {
+                "transfer_input_files": "file:///shared/in1.txt,"
+                "file:///repo/butler.yaml,file:///repo/gen3.sqlite3"
+            },
+        )
+
+    def testSharedNormalizesPaths(self):
+        self.workflow.add_job_inputs(
+            self.gwjob.name,
+            [
+                GenericWorkflowFile("in1", src_uri="/shared/./in1.txt", wms_transfer=True),
+                GenericWorkflowFile("butlerConfig", src_uri="/repo/", wms_transfer=True),
+            ],
+        )
+        result = _handle_job_inputs(self.workflow, self.gwjob.name, True, "/submit")
+        self.assertEqual(
+            result,
+            {
+                "transfer_input_files": "file:///shared/in1.txt,"
+                "file:///repo/butler.yaml,file:///repo/gen3.sqlite3"
+            },
+        )
+
+    def testSharedDirectory(self):
+        self.workflow.add_job_inputs(
+            self.gwjob.name, [GenericWorkflowFile("in1", src_uri=TESTDIR, wms_transfer=True)]
+        )
+        with self.assertRaisesRegex(RuntimeError, "cannot transfer directories"):
+            _handle_job_inputs(self.workflow, self.gwjob.name, True, "/submit")
+
+
+class ReplaceCmdVarsTestCase(unittest.TestCase):
+    """Test _replace_cmd_vars function."""
+
+    def testNoPlaceholders(self):
+        gwjob = GenericWorkflowJob("job1", label="label1", cmdvals={"qgraphFile": "a.qgraph"})
+        self.assertEqual(_replace_cmd_vars("run --foo bar", gwjob), "run --foo bar")
+
+    def testPlaceholders(self):
+        gwjob = GenericWorkflowJob("job1", label="label1", cmdvals={"qgraphFile": "a.qgraph"})
+        self.assertEqual(_replace_cmd_vars("run -g {qgraphFile} {{x}}", gwjob), "run -g a.qgraph {x}")
+
+    def testMissingReplacement(self):
+        gwjob = GenericWorkflowJob("job1", label="label1")
+        with self.assertRaises(KeyError):
+            _replace_cmd_vars("run -g {qgraphFile}", gwjob)
+
+
+class ReplaceFileVarsTestCase(unittest.TestCase):
+    """Test _replace_file_vars function."""
+
+    def setUp(self):
+        self.gw_exec = GenericWorkflowExec("test_exec", "/dummy/dir/pipetask")
+        self.gwjob = GenericWorkflowJob("job1", label="label1", executable=self.gw_exec)
+        self.workflow = GenericWorkflow("test")
+        self.workflow.add_job(self.gwjob)
+        self.workflow.add_job_inputs(
+            self.gwjob.name,
+            [
+                GenericWorkflowFile("in1", src_uri="/submit/in1.txt", wms_transfer=True),
+                GenericWorkflowFile("in2", src_uri="/repo/in2.txt", wms_transfer=False),
+            ],
+        )
+        self.workflow.add_job_outputs(
+            self.gwjob.name, [GenericWorkflowFile("out1", src_uri="/submit/out1.txt", wms_transfer=True)]
+        )
+
+    def testReplacing(self):
+        arguments = "-a <FILE:in1> -b <FILE:in2> -c <FILE:out1> -d <FILE:in1>"
+        result = _replace_file_vars(False, arguments, self.workflow, self.gwjob)
+        self.assertEqual(result, "-a in1.txt -b /repo/in2.txt -c out1.txt -d in1.txt")
+
+    def testUnknownPlaceholder(self):
+        arguments = "-a <FILE:in1> -b <FILE:unknown>"
+        result = _replace_file_vars(False, arguments, self.workflow, self.gwjob)
+        self.assertEqual(result, "-a in1.txt -b <FILE:unknown>")
+
+    def testSharedFilesystem(self):
+        self.workflow.add_job_inputs(
+            self.gwjob.name,
+            [
+                GenericWorkflowFile("in3", src_uri="/shared/in3.txt", wms_transfer=True, job_shared=True),
+                GenericWorkflowFile("butlerConfig", src_uri="/repo", wms_transfer=True),
+            ],
+        )
+        arguments = "-a <FILE:in1> -c <FILE:in3> -d <FILE:butlerConfig>"
+        result = _replace_file_vars(True, arguments, self.workflow, self.gwjob)
+        self.assertEqual(result, "-a in1.txt -c /shared/in3.txt -d butler.yaml")
+
+    def testSharedFilesystemButlerConfigOutput(self):
+        self.workflow.add_job_outputs(
+            self.gwjob.name, [GenericWorkflowFile("butlerConfig", src_uri="/repo", wms_transfer=True)]
+        )
+        arguments = "-a <FILE:in1> -d <FILE:butlerConfig>"
+        result = _replace_file_vars(True, arguments, self.workflow, self.gwjob)
+        self.assertEqual(result, "-a in1.txt -d repo")
+
+
+class GetStateCountsFromDagJobTestCase(unittest.TestCase):
+    """Test counting number of jobs per WMS state."""
+
+    JOB = types.MappingProxyType(
+        {
             "DAG_NodesDone": 1,
             "DAG_JobsHeld": 2,
             "DAG_NodesFailed": 3,
@@ -403,8 +655,10 @@ class GetStateCountsFromDagJobTestCase(unittest.TestCase):
             "DAG_NodesUnready": 7,
             "DAG_NodesTotal": 22,
         }
+    )
 
-        truth = {
+    COUNTS = types.MappingProxyType(
+        {
             WmsStates.SUCCEEDED: 1,
             WmsStates.HELD: 2,
             WmsStates.UNREADY: 7,
@@ -413,91 +667,163 @@ class GetStateCountsFromDagJobTestCase(unittest.TestCase):
             WmsStates.PRUNED: 4,
             WmsStates.MISFIT: 0,
         }
+    )
 
-        total, result = _get_state_counts_from_dag_job(job)
+    def testCounts(self):
+        total, result = _get_state_counts_from_dag_job(self.JOB)
         self.assertEqual(total, 22)
-        self.assertEqual(result, truth)
+        self.assertEqual(result, self.COUNTS)
+
+    def testCountsFromNodeStatus(self):
+        job = {
+            "NodesDone": 1,
+            "JobProcsHeld": 2,
+            "NodesFailed": 3,
+            "NodesFutile": 4,
+            "NodesPre": 1,
+            "NodesPost": 2,
+            "NodesReady": 0,
+            "NodesUnready": 7,
+            "NodesTotal": 20,
+        }
+
+        # Pre and post script nodes are counted as MISFIT.
+        total, result = _get_state_counts_from_dag_job(job)
+        self.assertEqual(total, 20)
+        self.assertEqual(result, self.COUNTS | {WmsStates.MISFIT: 3})
+
+    def testNoCounts(self):
+        total, result = _get_state_counts_from_dag_job({"Iwd": "/tmp/run"})
+        self.assertEqual(total, 0)
+        self.assertEqual(result, dict.fromkeys(WmsStates, 0))
 
 
 class GetInfoFromPathTestCase(unittest.TestCase):
     """Test _get_info_from_path function."""
 
+    RUN_FILE_SUFFIXES = (
+        ".dag",
+        ".dag.dagman.log",
+        ".dag.dagman.out",
+        ".dag.nodes.log",
+        ".node_status",
+        ".info.json",
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        # _get_info_from_path only reads these files, so stage each case once.
+        cls.tmp_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        root = Path(cls.tmp_dir).resolve()
+        cls.abort_dir = root / "abort"
+        cls.abort_dir.mkdir()
+        _stage(DATA_DIR / "test_tmpdir_abort.dag.dagman.out", cls.abort_dir)
+        cls.no_messages_dir = root / "no_messages"
+        cls.no_messages_dir.mkdir()
+        _stage(DATA_DIR / "test_no_messages.dag.dagman.out", cls.no_messages_dir)
+        cls.run_dir = root / "subdir"
+        cls.run_dir.mkdir()
+        for suffix in cls.RUN_FILE_SUFFIXES:
+            _stage(DATA_DIR / f"test_pipelines_check_20240727T003507Z{suffix}", cls.run_dir)
+
     def test_tmpdir_abort(self):
-        with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_tmpdir_abort.dag.dagman.out", tmp_dir)
-            wms_workflow_id, jobs, message = _get_info_from_path(tmp_dir)
-            self.assertEqual(wms_workflow_id, MISSING_ID)
-            self.assertEqual(jobs, {})
-            self.assertIn("Cannot submit from /tmp", message)
+        wms_workflow_id, jobs, message = _get_info_from_path(str(self.abort_dir))
+        self.assertEqual(wms_workflow_id, MISSING_ID)
+        self.assertEqual(jobs, {})
+        self.assertIn("Cannot submit from /tmp", message)
 
     def test_no_dagman_messages(self):
-        with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_no_messages.dag.dagman.out", tmp_dir)
-            wms_workflow_id, jobs, message = _get_info_from_path(tmp_dir)
-            self.assertEqual(wms_workflow_id, MISSING_ID)
-            self.assertEqual(jobs, {})
-            self.assertIn("Could not find HTCondor files", message)
+        wms_workflow_id, jobs, message = _get_info_from_path(str(self.no_messages_dir))
+        self.assertEqual(wms_workflow_id, MISSING_ID)
+        self.assertEqual(jobs, {})
+        self.assertIn("Could not find HTCondor files", message)
 
     def test_successful_run(self):
-        with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag", tmp_dir)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.dagman.log", tmp_dir)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.dagman.out", tmp_dir)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.nodes.log", tmp_dir)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.node_status", tmp_dir)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.info.json", tmp_dir)
-            wms_workflow_id, jobs, message = _get_info_from_path(tmp_dir)
-            self.assertEqual(wms_workflow_id, "1163.0")
-            self.assertEqual(len(jobs), 6)  # dag, pipetaskInit, 3 science, finalJob
-            self.assertEqual(message, "")
+        wms_workflow_id, jobs, message = _get_info_from_path(str(self.run_dir))
+        self.assertEqual(wms_workflow_id, "1163.0")
+        self.assertEqual(len(jobs), 6)  # dag, pipetaskInit, 3 science, finalJob
+        self.assertEqual(message, "")
 
     def test_relative_path(self):
-        orig_dir = Path.cwd()
-        with temporaryDirectory() as tmp_dir:
-            os.chdir(tmp_dir)
-            abs_path = Path(tmp_dir).resolve() / "subdir"
-            abs_path.mkdir()
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag", abs_path)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.dagman.log", abs_path)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.dagman.out", abs_path)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.dag.nodes.log", abs_path)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.node_status", abs_path)
-            copy2(f"{TESTDIR}/data/test_pipelines_check_20240727T003507Z.info.json", abs_path)
+        with contextlib.chdir(self.tmp_dir):
             wms_workflow_id, jobs, message = _get_info_from_path("subdir")
-            self.assertEqual(wms_workflow_id, "1163.0")
-            self.assertEqual(len(jobs), 6)  # dag, pipetaskInit, 3 science, finalJob
-            self.assertEqual(message, "")
-            self.assertEqual(jobs["1163.0"]["Iwd"], str(abs_path))
-            os.chdir(orig_dir)
+        self.assertEqual(wms_workflow_id, "1163.0")
+        self.assertEqual(len(jobs), 6)  # dag, pipetaskInit, 3 science, finalJob
+        self.assertEqual(message, "")
+        self.assertEqual(jobs["1163.0"]["Iwd"], str(self.run_dir))
+
+
+class IsServiceJobTestCase(unittest.TestCase):
+    """Test is_service_job function."""
+
+    def testServiceJob(self):
+        self.assertTrue(is_service_job("0.1"))
+        self.assertTrue(is_service_job("0"))
+        self.assertTrue(is_service_job("00.0"))
+
+    def testPayloadJob(self):
+        self.assertFalse(is_service_job("10.0"))
+        self.assertFalse(is_service_job("1"))
+
+
+class LocateGlobalIdScheddsTestCase(unittest.TestCase):
+    """Test _locate_global_id_schedds function."""
+
+    def setUp(self):
+        self.coll = unittest.mock.Mock()
+        self.global_id = "sched1.example.com#1234.0#1700000000"
+
+    def testScheddFromId(self):
+        self.coll.locate.return_value = {"Name": "sched1.example.com"}
+        schedd_ads = _locate_global_id_schedds(self.coll, self.global_id)
+        self.assertEqual(schedd_ads, [{"Name": "sched1.example.com"}])
+        self.coll.locate.assert_called_once_with(htcondor.DaemonTypes.Schedd, "sched1.example.com")
+        self.coll.locateAll.assert_not_called()
+
+    def testUnknownSchedd(self):
+        self.coll.locate.side_effect = htcondor.HTCondorLocateError("Unable to find daemon")
+        self.coll.locateAll.return_value = [{"Name": "sched2"}, {"Name": "sched3"}]
+        schedd_ads = _locate_global_id_schedds(self.coll, self.global_id)
+        self.assertEqual(schedd_ads, [{"Name": "sched2"}, {"Name": "sched3"}])
+
+    def testCollectorFailure(self):
+        self.coll.locate.side_effect = htcondor.HTCondorIOError("Failed communication with collector")
+        with self.assertRaises(htcondor.HTCondorIOError):
+            _locate_global_id_schedds(self.coll, self.global_id)
+        self.coll.locateAll.assert_not_called()
 
 
 class WmsIdToDirTestCase(unittest.TestCase):
     """Test _wms_id_to_dir function."""
 
-    @unittest.mock.patch("lsst.ctrl.bps.htcondor.htcondor_service._wms_id_type")
-    def testInvalidIdType(self, _wms_id_type_mock):
-        _wms_id_type_mock.return_value = WmsIdType.UNKNOWN
+    @classmethod
+    def setUpClass(cls):
+        cls.tmp_dir = cls.enterClassContext(temporaryDirectory())
+        # _wms_id_to_dir returns resolved paths, so resolve symlinks once.
+        cls.resolved_dir = Path(cls.tmp_dir).resolve()
+
+    def setUp(self):
+        self.wms_id_type_mock = self.enterContext(
+            unittest.mock.patch("lsst.ctrl.bps.htcondor.htcondor_service._wms_id_type")
+        )
+
+    def testInvalidIdType(self):
+        self.wms_id_type_mock.return_value = WmsIdType.UNKNOWN
         with self.assertRaises(TypeError) as cm:
             _, _ = _wms_id_to_dir("not_used")
         self.assertIn("Invalid job id type", str(cm.exception))
 
-    @unittest.mock.patch("lsst.ctrl.bps.htcondor.htcondor_service._wms_id_type")
-    def testAbsPathId(self, mock_wms_id_type):
-        mock_wms_id_type.return_value = WmsIdType.PATH
-        with temporaryDirectory() as tmp_dir:
-            wms_path, id_type = _wms_id_to_dir(tmp_dir)
-            self.assertEqual(id_type, WmsIdType.PATH)
-            self.assertEqual(Path(tmp_dir).resolve(), wms_path)
-
-    @unittest.mock.patch("lsst.ctrl.bps.htcondor.htcondor_service._wms_id_type")
-    def testRelPathId(self, _wms_id_type_mock):
-        _wms_id_type_mock.return_value = WmsIdType.PATH
-        orig_dir = Path.cwd()
-        with temporaryDirectory() as tmp_dir:
-            os.chdir(tmp_dir)
-            abs_path = Path(tmp_dir) / "newdir"
-            abs_path.mkdir()
+    def testAbsPathId(self):
+        self.wms_id_type_mock.return_value = WmsIdType.PATH
+        wms_path, id_type = _wms_id_to_dir(self.tmp_dir)
+        self.assertEqual(id_type, WmsIdType.PATH)
+        self.assertEqual(self.resolved_dir, wms_path)
+
+    def testRelPathId(self):
+        self.wms_id_type_mock.return_value = WmsIdType.PATH
+        abs_path = self.resolved_dir / "newdir"
+        abs_path.mkdir()
+        with contextlib.chdir(self.tmp_dir):
             wms_path, id_type = _wms_id_to_dir("newdir")
-            self.assertEqual(id_type, WmsIdType.PATH)
-            self.assertEqual(abs_path.resolve(), wms_path)
-            os.chdir(orig_dir)
+        self.assertEqual(id_type, WmsIdType.PATH)
+        self.assertEqual(abs_path, wms_path)
@@ -39,6 +39,7 @@ from lsst.utils.tests import temporaryDirectory
 
 logger = logging.getLogger("lsst.ctrl.bps.htcondor")
 TESTDIR = os.path.abspath(os.path.dirname(__file__))
+DATA_DIR = pathlib.Path(TESTDIR, "data")
 
 
 class TestLsstHtc(unittest.TestCase):
@@ -69,21 +70,24 @@ class TestLsstHtc(unittest.TestCase):
 class TweakJobInfoTestCase(unittest.TestCase):
     """Test the function responsible for massaging job information."""
 
+    @classmethod
+    def setUpClass(cls):
+        # _tweak_log_info never reads the log, it only needs it to exist.
+        cls.tmp_dir = cls.enterClassContext(tempfile.TemporaryDirectory())
+        cls.log_name = pathlib.Path(cls.tmp_dir) / "test.log"
+        cls.log_name.touch()
+        cls.owner = cls.log_name.owner()
+
     def setUp(self):
-        self.log_file = tempfile.NamedTemporaryFile(prefix="test_", suffix=".log")
-        self.log_name = pathlib.Path(self.log_file.name)
         self.job = {
             "Cluster": 1,
             "Proc": 0,
             "Iwd": str(self.log_name.parent),
-            "Owner": self.log_name.owner(),
+            "Owner": self.owner,
             "MyType": None,
             "TerminatedNormally": True,
         }
 
-    def tearDown(self):
-        self.log_file.close()
-
     def testDirectAssignments(self):
         lssthtc._tweak_log_info(self.log_name, self.job)
         self.assertEqual(self.job["ClusterId"], self.job["Cluster"])
@@ -91,41 +95,21 @@ class TweakJobInfoTestCase(unittest.TestCase):
         self.assertEqual(self.job["Iwd"], str(self.log_name.parent))
         self.assertEqual(self.job["Owner"], self.log_name.owner())
 
-    def testJobStatusAssignmentJobAbortedEvent(self):
-        job = self.job | {"MyType": "JobAbortedEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.REMOVED)
-
-    def testJobStatusAssignmentExecuteEvent(self):
-        job = self.job | {"MyType": "ExecuteEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.RUNNING)
-
-    def testJobStatusAssignmentSubmitEvent(self):
-        job = self.job | {"MyType": "SubmitEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.IDLE)
-
-    def testJobStatusAssignmentJobHeldEvent(self):
-        job = self.job | {"MyType": "JobHeldEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.HELD)
-
-    def testJobStatusAssignmentJobTerminatedEvent(self):
-        job = self.job | {"MyType": "JobTerminatedEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.COMPLETED)
-
-    def testJobStatusAssignmentPostScriptTerminatedEvent(self):
-        job = self.job | {"MyType": "PostScriptTerminatedEvent"}
-        lssthtc._tweak_log_info(self.log_name, job)
-        self.assertTrue("JobStatus" in job)
-        self.assertEqual(job["JobStatus"], htcondor.JobStatus.COMPLETED)
+    def testJobStatusAssignments(self):
+        cases = (
+            ("JobAbortedEvent", htcondor.JobStatus.REMOVED),
+            ("ExecuteEvent", htcondor.JobStatus.RUNNING),
+            ("SubmitEvent", htcondor.JobStatus.IDLE),
+            ("JobHeldEvent", htcondor.JobStatus.HELD),
+            ("JobTerminatedEvent", htcondor.JobStatus.COMPLETED),
+            ("PostScriptTerminatedEvent", htcondor.JobStatus.COMPLETED),
+        )
+        for my_type, status in cases:
+            with self.subTest(event=my_type):
+                job = self.job | {"MyType": my_type}
+                lssthtc._tweak_log_info(self.log_name, job)
+                self.assertTrue("JobStatus" in job)
+                self.assertEqual(job["JobStatus"], status)
 
     def testAddingExitStatusSuccess(self):
         job = self.job | {
@@ -170,7 +154,7 @@ class HtcCheckDagmanOutputTestCase(unittest.TestCase):
 
     def test_permissions_output_file(self):
         with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_tmpdir_abort.dag.dagman.out", tmp_dir)
+            copy2(DATA_DIR / "test_tmpdir_abort.dag.dagman.out", tmp_dir)
             os.chmod(f"{tmp_dir}/test_tmpdir_abort.dag.dagman.out", 0o200)
             print(os.stat(f"{tmp_dir}/test_tmpdir_abort.dag.dagman.out"))
             results = lssthtc.htc_check_dagman_output(tmp_dir)
@@ -179,19 +163,19 @@ class HtcCheckDagmanOutputTestCase(unittest.TestCase):
 
     def test_submit_failure(self):
         with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/bad_submit.dag.dagman.out", tmp_dir)
+            copy2(DATA_DIR / "bad_submit.dag.dagman.out", tmp_dir)
             results = lssthtc.htc_check_dagman_output(tmp_dir)
             self.assertIn("Warn: Job submission issues (last: ", results)
 
     def test_tmpdir_abort(self):
         with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_tmpdir_abort.dag.dagman.out", tmp_dir)
+            copy2(DATA_DIR / "test_tmpdir_abort.dag.dagman.out", tmp_dir)
             results = lssthtc.htc_check_dagman_output(tmp_dir)
             self.assertIn("Cannot submit from /tmp", results)
 
     def test_no_messages(self):
         with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/test_no_messages.dag.dagman.out", tmp_dir)
+            copy2(DATA_DIR / "test_no_messages.dag.dagman.out", tmp_dir)
             results = lssthtc.htc_check_dagman_output(tmp_dir)
             self.assertEqual("", results)
 
@@ -207,7 +191,7 @@ class SummaryFromDagTestCase(unittest.TestCase):
 
     def test_success(self):
         with temporaryDirectory() as tmp_dir:
-            copy2(f"{TESTDIR}/data/good.dag", tmp_dir)
+            copy2(DATA_DIR / "good.dag", tmp_dir)
             summary, job_name_to_pipetask = lssthtc.summary_from_dag(tmp_dir)
             self.assertEqual(summary, "pipetaskInit:1;label1:1;label2:1;label3:1;finalJob:1")
             self.assertEqual(
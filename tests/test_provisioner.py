@@ -130,6 +130,7 @@ class ProvisionerTestCase(unittest.TestCase):
             self.assertEqual(prov_config.read_text(), "foo")
             self.assertTrue(prov_script.is_file())
             self.assertEqual(prov_script.read_text(), "bar")
+            self.assertEqual(prov_script.stat().st_mode & 0o777, 0o755)
 
     def testPrepareIfNotConfigured(self):
         """Test if method raises when the configuration step was skipped."""